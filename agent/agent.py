@@ -19,26 +19,52 @@ Licença: MIT
 """
 
 import os
+import re
 import sys
 import time
 import json
+import base64
+import ctypes
+import gzip
+import random
+import heapq
+import hashlib
 import logging
+import logging.handlers
+import queue
 import signal
 import socket
 import subprocess
 import configparser
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 
 try:
     import requests
-    from requests.auth import HTTPBasicAuth
+    from requests.adapters import HTTPAdapter, Retry
 except ImportError:
     print("ERRO: Módulo 'requests' não encontrado.")
     print("Instale com: pkg install py311-requests")
     sys.exit(1)
 
+try:
+    import orjson
+
+    def _json_dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    def _json_loads(data: bytes) -> Any:
+        return orjson.loads(data)
+except ImportError:
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode('utf-8')
+
+    def _json_loads(data: bytes) -> Any:
+        return json.loads(data)
+
 DEFAULT_CONFIG = {
     'opnsense': {
         'api_url': 'https://127.0.0.1/api',
@@ -56,12 +82,144 @@ DEFAULT_CONFIG = {
         'interval_high': '60',
         'interval_medium': '300',
         'interval_low': '1800',
+        'wan_interfaces': '',
         'log_level': 'INFO',
         'log_file': '/var/log/firewall365/agent.log'
     }
 }
 
 CONFIG_PATH = '/etc/firewall365/agent.conf'
+STATE_PATH = '/var/lib/firewall365/state.json'
+
+# Endpoints da API do OPNSense consultados pelos coletores
+_OPN_ENDPOINTS = (
+    'diagnostics/traffic/interface',
+    'diagnostics/interface/getInterfaceStatistics',
+    'diagnostics/interface/getInterfaceNames',
+    'core/service/search',
+)
+
+_MEMORY_PAGE_KEYS = (
+    'vm.stats.vm.v_inactive_count',
+    'vm.stats.vm.v_cache_count',
+    'vm.stats.vm.v_free_count',
+)
+
+# Estados de CPU em kern.cp_time: user, nice, system, interrupt, idle
+_CPUSTATES = 5
+
+# Saída de `sysctl -n kern.boottime`: "{ sec = 1700000000, usec = ... }"
+_BOOTTIME_RE = re.compile(r'sec = (\d+)')
+
+# Corpos de telemetria acima deste tamanho são enviados com gzip
+_GZIP_THRESHOLD = 1024
+
+try:
+    _libc = ctypes.CDLL('libc.so.7', use_errno=True)
+except OSError:
+    _libc = None
+
+
+def _sysctl_raw(name: str, size: int) -> Optional[bytes]:
+    """Lê um OID sysctl direto da libc, sem fork de processo."""
+    if _libc is None:
+        return None
+    buf = ctypes.create_string_buffer(size)
+    length = ctypes.c_size_t(size)
+    if _libc.sysctlbyname(name.encode(), buf, ctypes.byref(length), None, 0) != 0:
+        return None
+    return buf.raw[:length.value]
+
+
+def _sysctl_uint(name: str) -> Optional[int]:
+    """Lê um OID sysctl inteiro (32 ou 64 bits)."""
+    raw = _sysctl_raw(name, 8)
+    if raw is None:
+        return None
+    return int.from_bytes(raw, sys.byteorder)
+
+
+def _sysctl_longs(name: str, count: int) -> Optional[List[int]]:
+    """Lê um OID sysctl como vetor de C longs."""
+    raw = _sysctl_raw(name, count * ctypes.sizeof(ctypes.c_long))
+    if raw is None or len(raw) % ctypes.sizeof(ctypes.c_long) != 0:
+        return None
+    arr = (ctypes.c_long * (len(raw) // ctypes.sizeof(ctypes.c_long))).from_buffer_copy(raw)
+    return list(arr)
+
+
+def _sysctl_str(name: str, size: int = 256) -> Optional[str]:
+    """Lê um OID sysctl de texto."""
+    raw = _sysctl_raw(name, size)
+    if raw is None:
+        return None
+    return raw.split(b'\x00', 1)[0].decode('utf-8', 'replace')
+
+
+def _sysctl_boottime() -> Optional[float]:
+    """Lê kern.boottime (struct timeval) via libc."""
+    raw = _sysctl_raw('kern.boottime', 16)
+    if raw is None or len(raw) < 8:
+        return None
+    return float(int.from_bytes(raw[:8], sys.byteorder, signed=True))
+
+
+def _sysctl_temperature(name: str) -> Optional[float]:
+    """Lê um OID de temperatura (formato IK: décimos de Kelvin) em °C."""
+    value = _sysctl_uint(name)
+    if not value:
+        return None
+    return round(value / 10.0 - 273.15, 1)
+
+
+def _iface_row(name: str, stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Materializa uma linha de estatísticas de interface para a API."""
+    g = stats.get
+    return {
+        'interfaceName': name,
+        'description': g('description', ''),
+        'status': 'up' if g('status') == 'active' else 'down',
+        'macAddress': g('macaddr', ''),
+        'ipAddress': g('ipaddr', ''),
+        'rxBytes': float(g('bytes received', 0)),
+        'txBytes': float(g('bytes transmitted', 0)),
+        'rxPackets': float(g('packets received', 0)),
+        'txPackets': float(g('packets transmitted', 0)),
+        'rxErrors': float(g('input errors', 0)),
+        'txErrors': float(g('output errors', 0)),
+        'linkSpeed': g('media', '')
+    }
+
+
+@dataclass(slots=True)
+class HighFreqTelemetry:
+    """Amostra de alta frequência; __slots__ evita um dict por instância.
+
+    O ciclo de alta frequência roda a cada poucos segundos por dias; manter
+    a amostra em atributos fixos reduz a pressão de GC no loop quente.
+    """
+
+    cpu: float = 0.0
+    memory: float = 0.0
+    wanThroughput: float = 0.0
+    interfaces: Dict[str, List[Any]] = field(default_factory=dict)
+
+
+class _SocketOptionsAdapter(HTTPAdapter):
+    """HTTPAdapter que desativa o algoritmo de Nagle nas conexões do pool.
+
+    Os payloads de telemetria são pequenos; sem TCP_NODELAY o flush pode
+    esperar até 40ms por um ACK antes de enviar o corpo do POST.
+    """
+
+    _socket_options = [
+        (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+        (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+    ]
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = self._socket_options
+        super().init_poolmanager(*args, **kwargs)
 
 
 class Firewall365Agent:
@@ -73,6 +231,32 @@ class Firewall365Agent:
         self._setup_logging()
         self.running = True
         self.last_cpu_times = None
+        self._last_cpu_total = 0
+        self._stop = threading.Event()
+        self._serial_number: Optional[str] = None
+        self._opnsense_version: Optional[str] = None
+        self._primary_ip: Optional[str] = None
+        self._send_backoff = 0.0
+        self._send_retry_at = 0.0
+        self._register_backoff = 0.0
+        self._sent_digests = self._load_state()
+        self.opn_session = self._build_opnsense_session()
+        self.fw_session = self._build_firewall365_session()
+        self._refresh_cached_config()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='fw365')
+
+        # Fatos imutáveis do sistema: resolvidos uma única vez no boot do
+        # agente em vez de a cada ciclo de coleta.
+        self._serial_number = self._read_serial_number()
+        self._opnsense_version = self._read_opnsense_version()
+        self._physmem = _sysctl_uint('hw.physmem')
+        self._page_size = _sysctl_uint('hw.pagesize') or 4096
+        self._boot_time = _sysctl_boottime()
+
+        # O IP de saída de um firewall quase nunca muda; resolve uma vez e
+        # só reavalia quando o status de alguma interface mudar.
+        self._primary_ip = self._read_primary_ip()
+        self._iface_status: Dict[str, str] = {}
         
         signal.signal(signal.SIGTERM, self._signal_handler)
         signal.signal(signal.SIGINT, self._signal_handler)
@@ -91,51 +275,194 @@ class Firewall365Agent:
             print("Criando configuração padrão...")
             self._create_default_config()
             config.read(self.config_path)
-        
+
+        try:
+            self._config_mtime = os.stat(self.config_path).st_mtime
+        except OSError:
+            self._config_mtime = 0.0
+
         return config
+
+    def _maybe_reload_config(self):
+        """Recarrega a configuração apenas se o arquivo mudou em disco.
+
+        Um stat por ciclo em vez de um reparse; permite editar o
+        agent.conf sem reiniciar o daemon.
+        """
+        try:
+            mtime = os.stat(self.config_path).st_mtime
+        except OSError:
+            return
+        if mtime == self._config_mtime:
+            return
+        self.logger.info("Configuração alterada em disco; recarregando...")
+        self.config = self._load_config()
+        self._refresh_cached_config()
+        # O header Basic e o verify ficam gravados nas sessões HTTP na
+        # criação; reconstrói ambas para que mudanças de api_key/api_secret
+        # e verify_ssl também valham sem reiniciar.
+        self.opn_session.close()
+        self.fw_session.close()
+        self.opn_session = self._build_opnsense_session()
+        self.fw_session = self._build_firewall365_session()
     
     def _create_default_config(self):
         """Cria arquivo de configuração padrão."""
         config_dir = os.path.dirname(self.config_path)
-        if config_dir and not os.path.exists(config_dir):
+        if config_dir:
             os.makedirs(config_dir, exist_ok=True)
         
         config = configparser.ConfigParser()
         for section, options in DEFAULT_CONFIG.items():
             config[section] = options
-        
-        with open(self.config_path, 'w') as f:
-            config.write(f)
+
+        self._write_config_atomic(config)
     
+    def _build_opnsense_session(self) -> requests.Session:
+        """Cria sessão HTTP persistente (keep-alive) para a API do OPNSense."""
+        session = requests.Session()
+        adapter = _SocketOptionsAdapter(
+            pool_connections=2, pool_maxsize=4,
+            max_retries=Retry(total=2, backoff_factor=0.3)
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        credentials = '{}:{}'.format(
+            self.config.get('opnsense', 'api_key'),
+            self.config.get('opnsense', 'api_secret')
+        ).encode()
+        session.headers['Authorization'] = 'Basic ' + base64.b64encode(credentials).decode('ascii')
+        session.verify = self.config.getboolean('opnsense', 'verify_ssl', fallback=False)
+        session.headers['Connection'] = 'keep-alive'
+        return session
+
+    def _build_firewall365_session(self) -> requests.Session:
+        """Cria sessão HTTP persistente (keep-alive) para a plataforma Firewall365."""
+        session = requests.Session()
+        adapter = _SocketOptionsAdapter(
+            pool_connections=2, pool_maxsize=4,
+            max_retries=Retry(total=2, backoff_factor=0.3)
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.verify = self.config.getboolean('firewall365', 'verify_ssl', fallback=True)
+        session.headers['Connection'] = 'keep-alive'
+        return session
+
+    def _write_config_atomic(self, config: configparser.ConfigParser):
+        """Grava a configuração via arquivo temporário + os.replace.
+
+        Evita deixar um agent.conf truncado se o processo morrer
+        (SIGTERM, queda de energia) no meio da escrita.
+        """
+        tmp_path = self.config_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            config.write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.config_path)
+
     def _save_config(self):
         """Salva configuração atual no arquivo."""
-        with open(self.config_path, 'w') as f:
-            self.config.write(f)
+        self._write_config_atomic(self.config)
+        try:
+            self._config_mtime = os.stat(self.config_path).st_mtime
+        except OSError:
+            pass
+        self._refresh_cached_config()
+
+    def _load_state(self) -> Dict[str, str]:
+        """Carrega os digests dos últimos payloads aceitos pela plataforma."""
+        try:
+            with open(STATE_PATH, 'rb') as f:
+                state = _json_loads(f.read())
+            digests = state.get('digests', {})
+            if isinstance(digests, dict):
+                return {k: v for k, v in digests.items() if isinstance(v, str)}
+        except (OSError, ValueError):
+            pass
+        return {}
+
+    def _save_state(self):
+        """Persiste os digests de envio (mesmo padrão atômico do config)."""
+        try:
+            state_dir = os.path.dirname(STATE_PATH)
+            if state_dir:
+                os.makedirs(state_dir, exist_ok=True)
+            tmp_path = STATE_PATH + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(_json_dumps({'digests': self._sent_digests}))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, STATE_PATH)
+        except OSError as e:
+            self.logger.debug(f"Erro ao gravar estado: {e}")
+
+    @staticmethod
+    def _payload_digest(obj: Any) -> str:
+        """Digest curto e estável de um payload já serializável em JSON."""
+        return hashlib.blake2b(_json_dumps(obj), digest_size=16).hexdigest()
+
+    def _refresh_cached_config(self):
+        """Resolve os valores de configuração do caminho quente em atributos.
+
+        ConfigParser.get refaz interpolação e busca de seção a cada chamada;
+        os coletores rodam a cada minuto, então os valores são resolvidos uma
+        única vez aqui e reavaliados apenas quando a configuração é regravada.
+        """
+        self._opn_api_url = self.config.get('opnsense', 'api_url')
+        self._opn_urls = {name: f"{self._opn_api_url}/{name}" for name in _OPN_ENDPOINTS}
+        self._fw_endpoint = self.config.get('firewall365', 'endpoint')
+        self._fw_token = self.config.get('firewall365', 'bearer_token')
+        self._fw_firewall_id = self.config.get('firewall365', 'firewall_id')
+        self._fw_headers = {
+            'Authorization': f'Bearer {self._fw_token}',
+            'Content-Type': 'application/json'
+        }
+        raw_wan = self.config.get('agent', 'wan_interfaces', fallback='')
+        self._wan_ifaces = frozenset(name.strip() for name in raw_wan.split(',') if name.strip())
+        self._interval_high = self.config.getint('agent', 'interval_high', fallback=60)
+        self._interval_medium = self.config.getint('agent', 'interval_medium', fallback=300)
+        self._interval_low = self.config.getint('agent', 'interval_low', fallback=1800)
     
     def _setup_logging(self):
-        """Configura sistema de logging."""
+        """Configura sistema de logging.
+
+        Os handlers reais (arquivo + stdout) rodam atrás de um QueueListener
+        em thread própria; os coletores só enfileiram registros e nunca
+        bloqueiam em I/O de disco.
+        """
         log_level = getattr(logging, self.config.get('agent', 'log_level', fallback='INFO'))
         log_file = self.config.get('agent', 'log_file', fallback='/var/log/firewall365/agent.log')
-        
+
         log_dir = os.path.dirname(log_file)
-        if log_dir and not os.path.exists(log_dir):
+        if log_dir:
             os.makedirs(log_dir, exist_ok=True)
-        
-        logging.basicConfig(
-            level=log_level,
-            format='%(asctime)s [%(levelname)s] %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S',
-            handlers=[
-                logging.FileHandler(log_file),
-                logging.StreamHandler(sys.stdout)
-            ]
+
+        formatter = logging.Formatter(
+            '%(asctime)s [%(levelname)s] %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
         )
+        file_handler = logging.FileHandler(log_file, delay=True)
+        file_handler.setFormatter(formatter)
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        root.setLevel(log_level)
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+        self._log_listener = logging.handlers.QueueListener(
+            log_queue, file_handler, stream_handler)
+        self._log_listener.start()
         self.logger = logging.getLogger('firewall365-agent')
     
     def _signal_handler(self, signum, frame):
         """Handler para sinais de término."""
         self.logger.info(f"Sinal {signum} recebido. Encerrando agente...")
         self.running = False
+        self._stop.set()
     
     def _get_system_info(self) -> Dict[str, Any]:
         """Coleta informações do sistema OPNSense."""
@@ -148,7 +475,17 @@ class Firewall365Agent:
         return info
     
     def _get_serial_number(self) -> str:
-        """Obtém número de série do sistema."""
+        """Obtém número de série do sistema (cacheado pela vida do processo)."""
+        if self._serial_number is None:
+            self._serial_number = self._read_serial_number()
+        return self._serial_number
+
+    def _read_serial_number(self) -> str:
+        """Descobre o número de série consultando o sistema."""
+        host_uuid = _sysctl_str('kern.hostuuid', 64)
+        if host_uuid:
+            return host_uuid.strip()[:36]
+
         try:
             result = subprocess.run(
                 ['sysctl', '-n', 'kern.hostuuid'],
@@ -169,10 +506,19 @@ class Firewall365Agent:
         except Exception:
             pass
         
-        return socket.gethostname() + "-" + hex(hash(socket.gethostname()))[-8:]
+        # hash() é randomizado por processo (PYTHONHASHSEED); usa SHA-256
+        # para que o serial de fallback seja estável entre reinícios.
+        hostname = socket.gethostname()
+        return hostname + "-" + hashlib.sha256(hostname.encode()).hexdigest()[:8]
     
     def _get_opnsense_version(self) -> str:
-        """Obtém versão do OPNSense."""
+        """Obtém versão do OPNSense (cacheada pela vida do processo)."""
+        if self._opnsense_version is None:
+            self._opnsense_version = self._read_opnsense_version()
+        return self._opnsense_version
+
+    def _read_opnsense_version(self) -> str:
+        """Descobre a versão do OPNSense instalada."""
         try:
             if os.path.exists('/usr/local/opnsense/version/opnsense'):
                 with open('/usr/local/opnsense/version/opnsense', 'r') as f:
@@ -193,7 +539,20 @@ class Firewall365Agent:
         return "Unknown"
     
     def _get_primary_ip(self) -> str:
-        """Obtém IP primário do sistema."""
+        """Obtém IP primário do sistema (cacheado; ver _refresh_primary_ip)."""
+        if self._primary_ip is None:
+            self._primary_ip = self._read_primary_ip()
+        return self._primary_ip
+
+    def _refresh_primary_ip(self):
+        """Reavalia o IP primário após mudança de status de interface."""
+        ip = self._read_primary_ip()
+        if ip != self._primary_ip:
+            self.logger.info(f"IP primário mudou: {self._primary_ip} -> {ip}")
+            self._primary_ip = ip
+
+    def _read_primary_ip(self) -> str:
+        """Descobre o IP primário via socket UDP."""
         try:
             s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             s.connect(("8.8.8.8", 80))
@@ -205,10 +564,9 @@ class Firewall365Agent:
     
     def auto_register(self) -> bool:
         """Registra o firewall automaticamente na plataforma."""
-        endpoint = self.config.get('firewall365', 'endpoint')
-        verify_ssl = self.config.getboolean('firewall365', 'verify_ssl', fallback=True)
-        
-        if self.config.get('firewall365', 'bearer_token') and self.config.get('firewall365', 'firewall_id'):
+        endpoint = self._fw_endpoint
+
+        if self._fw_token and self._fw_firewall_id:
             self.logger.info("Firewall já registrado. Pulando auto-registro.")
             return True
         
@@ -220,15 +578,14 @@ class Firewall365Agent:
         register_url = f"{endpoint}/agent/register"
         
         try:
-            response = requests.post(
+            response = self.fw_session.post(
                 register_url,
                 json=system_info,
-                verify=verify_ssl,
                 timeout=30
             )
             
             if response.status_code in [200, 201]:
-                data = response.json()
+                data = _json_loads(response.content)
                 
                 if 'token' in data:
                     self.config.set('firewall365', 'bearer_token', data['token'])
@@ -258,23 +615,13 @@ class Firewall365Agent:
     
     def _get_opnsense_api(self, endpoint: str) -> Optional[Dict[str, Any]]:
         """Faz requisição à API do OPNSense."""
-        api_url = self.config.get('opnsense', 'api_url')
-        api_key = self.config.get('opnsense', 'api_key')
-        api_secret = self.config.get('opnsense', 'api_secret')
-        verify_ssl = self.config.getboolean('opnsense', 'verify_ssl', fallback=False)
-        
-        url = f"{api_url}/{endpoint}"
-        
+        url = self._opn_urls.get(endpoint) or f"{self._opn_api_url}/{endpoint}"
+
         try:
-            response = requests.get(
-                url,
-                auth=HTTPBasicAuth(api_key, api_secret),
-                verify=verify_ssl,
-                timeout=10
-            )
+            response = self.opn_session.get(url, timeout=10)
             
             if response.status_code == 200:
-                return response.json()
+                return _json_loads(response.content)
             else:
                 self.logger.warning(f"API OPNSense retornou {response.status_code}: {endpoint}")
                 return None
@@ -283,74 +630,113 @@ class Firewall365Agent:
             self.logger.error(f"Erro ao acessar API OPNSense ({endpoint}): {e}")
             return None
 
-    def _get_cpu_percent(self) -> float:
-        """Coleta uso de CPU com cálculo preciso entre intervalos."""
+    def _sysctl_batch(self, keys: List[str]) -> Dict[str, str]:
+        """Lê várias chaves sysctl em uma única chamada de subprocess."""
         try:
             result = subprocess.run(
-                ['sysctl', '-n', 'kern.cp_time'],
+                ['sysctl', '-n', *keys],
                 capture_output=True, text=True, timeout=5
             )
             if result.returncode == 0:
-                cpu_times = [int(x) for x in result.stdout.strip().split()]
-                if len(cpu_times) >= 5:
-                    if self.last_cpu_times:
-                        idle_diff = cpu_times[4] - self.last_cpu_times[4]
-                        total_diff = sum(cpu_times) - sum(self.last_cpu_times)
-                        cpu_percent = round((1 - idle_diff / total_diff) * 100, 2) if total_diff > 0 else 0
-                    else:
-                        idle = cpu_times[4]
-                        total = sum(cpu_times)
-                        cpu_percent = round((1 - idle / total) * 100, 2) if total > 0 else 0
-                    self.last_cpu_times = cpu_times
-                    return cpu_percent
+                return dict(zip(keys, result.stdout.strip().split('\n')))
+        except Exception as e:
+            self.logger.debug(f"Erro ao executar sysctl: {e}")
+        return {}
+
+    def _read_high_frequency_counters(self) -> Dict[str, Any]:
+        """Lê contadores de CPU e memória, via libc quando disponível."""
+        counters: Dict[str, Any] = {}
+
+        if _libc is not None:
+            cpu_times = _sysctl_longs('kern.cp_time', _CPUSTATES)
+            if cpu_times is not None:
+                counters['cpu_times'] = cpu_times
+            if self._physmem:
+                counters['physmem'] = self._physmem
+                counters['free_pages'] = sum(
+                    pages for pages in (_sysctl_uint(key) for key in _MEMORY_PAGE_KEYS)
+                    if pages is not None
+                )
+            if counters:
+                return counters
+
+        values = self._sysctl_batch(['kern.cp_time', 'hw.physmem', *_MEMORY_PAGE_KEYS])
+        raw_cp_time = values.get('kern.cp_time', '')
+        if raw_cp_time:
+            counters['cpu_times'] = [int(x) for x in raw_cp_time.split() if x.isdigit()]
+        raw_physmem = values.get('hw.physmem', '')
+        if raw_physmem.isdigit():
+            counters['physmem'] = int(raw_physmem)
+            counters['free_pages'] = sum(
+                int(values[key]) for key in _MEMORY_PAGE_KEYS
+                if values.get(key, '').isdigit()
+            )
+        return counters
+
+    def _get_cpu_percent(self, cpu_times: Optional[List[int]]) -> float:
+        """Coleta uso de CPU com cálculo preciso entre intervalos."""
+        try:
+            if cpu_times and len(cpu_times) >= 5:
+                total = sum(cpu_times)
+                if self.last_cpu_times:
+                    idle_diff = cpu_times[4] - self.last_cpu_times[4]
+                    # O total da amostra anterior fica cacheado; uma soma por
+                    # ciclo em vez de duas.
+                    total_diff = total - self._last_cpu_total
+                    cpu_percent = round((1 - idle_diff / total_diff) * 100, 2) if total_diff > 0 else 0
+                else:
+                    # Primeira amostra: só inicializa a referência. A razão
+                    # acumulada desde o boot não representa a carga atual.
+                    cpu_percent = 0.0
+                self.last_cpu_times = cpu_times
+                self._last_cpu_total = total
+                return cpu_percent
         except Exception as e:
             self.logger.debug(f"Erro ao coletar CPU: {e}")
         return 0.0
 
-    def _get_memory_percent(self) -> float:
+    def _get_memory_percent(self, counters: Dict[str, Any]) -> float:
         """Coleta uso de memória."""
         try:
-            result = subprocess.run(
-                ['sysctl', '-n', 'hw.physmem', 'vm.stats.vm.v_inactive_count', 
-                 'vm.stats.vm.v_cache_count', 'vm.stats.vm.v_free_count'],
-                capture_output=True, text=True, timeout=5
-            )
-            if result.returncode == 0:
-                lines = result.stdout.strip().split('\n')
-                if len(lines) >= 1:
-                    physmem = int(lines[0])
-                    page_size = 4096
-                    free_pages = sum(int(lines[i]) for i in range(1, len(lines)) if lines[i].isdigit())
-                    free_mem = free_pages * page_size
-                    used_mem = physmem - free_mem
-                    return round((used_mem / physmem) * 100, 2) if physmem > 0 else 0
+            physmem = counters.get('physmem', 0)
+            if physmem > 0:
+                free_mem = counters.get('free_pages', 0) * self._page_size
+                used_mem = physmem - free_mem
+                return round((used_mem / physmem) * 100, 2)
         except Exception as e:
             self.logger.debug(f"Erro ao coletar memória: {e}")
         return 0.0
 
-    def collect_high_frequency(self) -> Optional[Dict[str, Any]]:
+    def collect_high_frequency(self) -> Optional[HighFreqTelemetry]:
         """Coleta dados de alta frequência (CPU, memória, throughput)."""
-        telemetry = {
-            'cpu': self._get_cpu_percent(),
-            'memory': self._get_memory_percent(),
-            'wanThroughput': 0.0,
-            'interfaces': {}
-        }
-        
+        counters = self._read_high_frequency_counters()
+        telemetry = HighFreqTelemetry(
+            cpu=self._get_cpu_percent(counters.get('cpu_times')),
+            memory=self._get_memory_percent(counters),
+        )
+
         traffic_data = self._get_opnsense_api('diagnostics/traffic/interface')
         if traffic_data and 'interfaces' in traffic_data:
             total_throughput = 0
+            wan_ifaces = self._wan_ifaces
+            # Layout colunar: evita repetir as chaves rateIn/rateOut por
+            # interface no JSON enviado (payload ~3x menor com muitas VLANs).
+            names: List[str] = []
+            rates_in: List[float] = []
+            rates_out: List[float] = []
             for iface_name, iface_data in traffic_data.get('interfaces', {}).items():
+                if wan_ifaces and iface_name not in wan_ifaces:
+                    continue
                 if isinstance(iface_data, dict):
                     rate_in = iface_data.get('rate_bits_in', 0)
                     rate_out = iface_data.get('rate_bits_out', 0)
                     total_throughput += rate_in + rate_out
-                    telemetry['interfaces'][iface_name] = {
-                        'rateIn': rate_in,
-                        'rateOut': rate_out
-                    }
-            telemetry['wanThroughput'] = round(total_throughput / 1_000_000, 2)
-        
+                    names.append(iface_name)
+                    rates_in.append(rate_in)
+                    rates_out.append(rate_out)
+            telemetry.interfaces = {'names': names, 'rateIn': rates_in, 'rateOut': rates_out}
+            telemetry.wanThroughput = round(total_throughput / 1_000_000, 2)
+
         return telemetry
     
     def collect_medium_frequency(self) -> Dict[str, Any]:
@@ -359,26 +745,37 @@ class Firewall365Agent:
             'interfaces': [],
             'services': []
         }
-        
-        iface_data = self._get_opnsense_api('diagnostics/interface/getInterfaceStatistics')
+
+        # As duas consultas são independentes; rodam em paralelo para que o
+        # tempo do ciclo seja o da mais lenta, não a soma das duas.
+        iface_future = self._executor.submit(
+            self._get_opnsense_api, 'diagnostics/interface/getInterfaceStatistics')
+        svc_future = self._executor.submit(self._get_opnsense_api, 'core/service/search')
+
+        iface_data = iface_future.result()
         if iface_data and 'statistics' in iface_data:
-            for name, stats in iface_data['statistics'].items():
-                if isinstance(stats, dict):
+            result['interfaces'] = [
+                _iface_row(name, stats)
+                for name, stats in iface_data['statistics'].items()
+                if isinstance(stats, dict)
+            ]
+            status_map = {row['interfaceName']: row['status'] for row in result['interfaces']}
+            if self._iface_status and status_map != self._iface_status:
+                self._refresh_primary_ip()
+            self._iface_status = status_map
+        
+        if not result['interfaces']:
+            # Enumeração local via kernel antes de recorrer à API HTTP.
+            try:
+                for _, name in socket.if_nameindex():
                     result['interfaces'].append({
                         'interfaceName': name,
-                        'description': stats.get('description', ''),
-                        'status': 'up' if stats.get('status') == 'active' else 'down',
-                        'macAddress': stats.get('macaddr', ''),
-                        'ipAddress': stats.get('ipaddr', ''),
-                        'rxBytes': float(stats.get('bytes received', 0)),
-                        'txBytes': float(stats.get('bytes transmitted', 0)),
-                        'rxPackets': float(stats.get('packets received', 0)),
-                        'txPackets': float(stats.get('packets transmitted', 0)),
-                        'rxErrors': float(stats.get('input errors', 0)),
-                        'txErrors': float(stats.get('output errors', 0)),
-                        'linkSpeed': stats.get('media', '')
+                        'description': name,
+                        'status': 'unknown'
                     })
-        
+            except OSError:
+                pass
+
         if not result['interfaces']:
             iface_names = self._get_opnsense_api('diagnostics/interface/getInterfaceNames')
             if iface_names:
@@ -389,7 +786,7 @@ class Firewall365Agent:
                         'status': 'unknown'
                     })
         
-        svc_data = self._get_opnsense_api('core/service/search')
+        svc_data = svc_future.result()
         if svc_data and 'rows' in svc_data:
             for svc in svc_data['rows']:
                 if isinstance(svc, dict):
@@ -416,90 +813,116 @@ class Firewall365Agent:
             'firmwareVersion': self._get_opnsense_version()
         }
         
-        try:
-            uptime_result = subprocess.run(
-                ['sysctl', '-n', 'kern.boottime'],
-                capture_output=True, text=True, timeout=5
-            )
-            if uptime_result.returncode == 0:
-                import re
-                match = re.search(r'sec = (\d+)', uptime_result.stdout)
-                if match:
-                    boot_time = int(match.group(1))
-                    result['uptime'] = time.time() - boot_time
-        except Exception as e:
-            self.logger.debug(f"Erro ao coletar uptime: {e}")
+        if self._boot_time is None:
+            try:
+                uptime_result = subprocess.run(
+                    ['sysctl', '-n', 'kern.boottime'],
+                    capture_output=True, text=True, timeout=5
+                )
+                if uptime_result.returncode == 0:
+                    match = _BOOTTIME_RE.search(uptime_result.stdout)
+                    if match:
+                        self._boot_time = float(match.group(1))
+            except Exception as e:
+                self.logger.debug(f"Erro ao coletar uptime: {e}")
+        if self._boot_time is not None:
+            result['uptime'] = time.time() - self._boot_time
         
         try:
-            load_result = subprocess.run(
-                ['sysctl', '-n', 'vm.loadavg'],
-                capture_output=True, text=True, timeout=5
-            )
-            if load_result.returncode == 0:
-                parts = load_result.stdout.strip().replace('{', '').replace('}', '').split()
-                if len(parts) >= 3:
-                    result['loadAvg1'] = float(parts[0])
-                    result['loadAvg5'] = float(parts[1])
-                    result['loadAvg15'] = float(parts[2])
-        except Exception as e:
-            self.logger.debug(f"Erro ao coletar load average: {e}")
+            # os.getloadavg() lê vm.loadavg direto da libc, sem subprocesso.
+            load1, load5, load15 = os.getloadavg()
+            result['loadAvg1'] = load1
+            result['loadAvg5'] = load5
+            result['loadAvg15'] = load15
+        except OSError:
+            try:
+                load_result = subprocess.run(
+                    ['sysctl', '-n', 'vm.loadavg'],
+                    capture_output=True, text=True, timeout=5
+                )
+                if load_result.returncode == 0:
+                    parts = load_result.stdout.strip().replace('{', '').replace('}', '').split()
+                    if len(parts) >= 3:
+                        result['loadAvg1'] = float(parts[0])
+                        result['loadAvg5'] = float(parts[1])
+                        result['loadAvg15'] = float(parts[2])
+            except Exception as e:
+                self.logger.debug(f"Erro ao coletar load average: {e}")
         
         try:
-            df_result = subprocess.run(
-                ['df', '-k', '/'],
-                capture_output=True, text=True, timeout=5
-            )
-            if df_result.returncode == 0:
-                lines = df_result.stdout.strip().split('\n')
-                if len(lines) >= 2:
-                    parts = lines[1].split()
-                    if len(parts) >= 5:
-                        total_kb = int(parts[1])
-                        used_kb = int(parts[2])
-                        result['diskTotal'] = total_kb / (1024 * 1024)
-                        result['diskUsed'] = used_kb / (1024 * 1024)
-                        result['diskPercent'] = (used_kb / total_kb * 100) if total_kb > 0 else 0
-        except Exception as e:
-            self.logger.debug(f"Erro ao coletar disco: {e}")
+            # Syscall direta; mesmos números do `df -k /` sem fork/exec.
+            st = os.statvfs('/')
+            total_bytes = st.f_blocks * st.f_frsize
+            used_bytes = (st.f_blocks - st.f_bfree) * st.f_frsize
+            result['diskTotal'] = total_bytes / (1024 ** 3)
+            result['diskUsed'] = used_bytes / (1024 ** 3)
+            result['diskPercent'] = (used_bytes / total_bytes * 100) if total_bytes > 0 else 0
+        except OSError:
+            try:
+                df_result = subprocess.run(
+                    ['df', '-k', '/'],
+                    capture_output=True, text=True, timeout=5
+                )
+                if df_result.returncode == 0:
+                    lines = df_result.stdout.strip().split('\n')
+                    if len(lines) >= 2:
+                        parts = lines[1].split()
+                        if len(parts) >= 5:
+                            total_kb = int(parts[1])
+                            used_kb = int(parts[2])
+                            result['diskTotal'] = total_kb / (1024 * 1024)
+                            result['diskUsed'] = used_kb / (1024 * 1024)
+                            result['diskPercent'] = (used_kb / total_kb * 100) if total_kb > 0 else 0
+            except Exception as e:
+                self.logger.debug(f"Erro ao coletar disco: {e}")
         
-        try:
-            temp_result = subprocess.run(
-                ['sysctl', '-n', 'dev.cpu.0.temperature'],
-                capture_output=True, text=True, timeout=5
-            )
-            if temp_result.returncode == 0:
-                temp_str = temp_result.stdout.strip().replace('C', '')
-                result['temperature'] = float(temp_str)
-        except Exception:
-            pass
+        temperature = _sysctl_temperature('dev.cpu.0.temperature')
+        if temperature is not None:
+            result['temperature'] = temperature
+        else:
+            try:
+                temp_result = subprocess.run(
+                    ['sysctl', '-n', 'dev.cpu.0.temperature'],
+                    capture_output=True, text=True, timeout=5
+                )
+                if temp_result.returncode == 0:
+                    temp_str = temp_result.stdout.strip().replace('C', '')
+                    result['temperature'] = float(temp_str)
+            except Exception:
+                pass
         
         return result
     
     def _send_to_api(self, endpoint: str, payload: Dict[str, Any]) -> bool:
         """Envia dados para a API."""
-        api_endpoint = self.config.get('firewall365', 'endpoint')
-        token = self.config.get('firewall365', 'bearer_token')
-        verify_ssl = self.config.getboolean('firewall365', 'verify_ssl', fallback=True)
-        
-        if not token:
+        if not self._fw_token:
             return False
-        
-        url = f"{api_endpoint}/{endpoint}"
-        headers = {
-            'Authorization': f'Bearer {token}',
-            'Content-Type': 'application/json'
-        }
-        
+
+        if time.time() < self._send_retry_at:
+            self.logger.debug(f"Backoff ativo; envio de {endpoint} adiado")
+            return False
+
+        url = f"{self._fw_endpoint}/{endpoint}"
+
+        body = _json_dumps(payload)
+        headers = self._fw_headers
+        if len(body) >= _GZIP_THRESHOLD:
+            # Payloads grandes (ex.: dezenas de interfaces) comprimem bem;
+            # o body-parser do servidor infla Content-Encoding: gzip.
+            body = gzip.compress(body, compresslevel=6)
+            headers = {**headers, 'Content-Encoding': 'gzip'}
+
         try:
-            response = requests.post(
+            response = self.fw_session.post(
                 url,
-                json=payload,
+                data=body,
                 headers=headers,
-                verify=verify_ssl,
                 timeout=30
             )
             
             if response.status_code in [200, 201]:
+                self._send_backoff = 0.0
+                self._send_retry_at = 0.0
                 return True
             elif response.status_code == 403:
                 self.logger.warning("Firewall aguardando aprovação")
@@ -512,19 +935,29 @@ class Firewall365Agent:
                 return False
                 
         except requests.exceptions.RequestException as e:
+            # Backoff exponencial com jitter: evita gastar handshakes TLS
+            # enquanto a plataforma central estiver inacessível.
+            self._send_backoff = min(self._send_backoff * 2, 300) if self._send_backoff else 1.0
+            self._send_retry_at = time.time() + self._send_backoff + random.uniform(0, self._send_backoff * 0.1)
             self.logger.error(f"Erro de conexão ({endpoint}): {e}")
             return False
     
-    def send_high_frequency(self, data: Dict[str, Any]) -> bool:
+    def send_high_frequency(self, data: HighFreqTelemetry) -> bool:
         """Envia telemetria de alta frequência."""
-        firewall_id = self.config.get('firewall365', 'firewall_id')
-        payload = {'firewallId': firewall_id, **data}
+        # Payload montado campo a campo (asdict copiaria o dict aninhado).
+        payload = {
+            'firewallId': self._fw_firewall_id,
+            'cpu': data.cpu,
+            'memory': data.memory,
+            'wanThroughput': data.wanThroughput,
+            'interfaces': data.interfaces,
+        }
         return self._send_to_api('telemetry', payload)
-    
+
     def send_medium_frequency(self, data: Dict[str, Any]) -> bool:
         """Envia telemetria de média frequência."""
-        firewall_id = self.config.get('firewall365', 'firewall_id')
-        
+        firewall_id = self._fw_firewall_id
+
         success = True
         
         if data.get('interfaces'):
@@ -533,18 +966,69 @@ class Firewall365Agent:
                 success = False
         
         if data.get('services'):
+            # Lista de serviços raramente muda; só envia quando o digest
+            # difere do último aceito pela plataforma. O digest cobre o
+            # payload inteiro: um re-registro com novo firewallId volta a
+            # enviar mesmo com os serviços inalterados.
             payload = {'firewallId': firewall_id, 'services': data['services']}
-            if not self._send_to_api('telemetry/services', payload):
-                success = False
-        
+            digest = self._payload_digest(payload)
+            if digest != self._sent_digests.get('services'):
+                if self._send_to_api('telemetry/services', payload):
+                    self._sent_digests['services'] = digest
+                    self._save_state()
+                else:
+                    success = False
+
         return success
     
     def send_low_frequency(self, data: Dict[str, Any]) -> bool:
         """Envia telemetria de baixa frequência."""
-        firewall_id = self.config.get('firewall365', 'firewall_id')
-        payload = {'firewallId': firewall_id, **data}
-        return self._send_to_api('telemetry/system', payload)
+        # O uptime cresce sozinho a cada ciclo e não justifica um POST; no
+        # digest ele é trocado pelo timestamp de boot, que só muda em
+        # reboot — assim um reinício sempre gera envio mesmo com o digest
+        # persistido de antes ainda batendo no restante do payload.
+        payload = {'firewallId': self._fw_firewall_id, **data}
+        digest_src = {k: v for k, v in payload.items() if k != 'uptime'}
+        digest_src['bootTime'] = self._boot_time
+        digest = self._payload_digest(digest_src)
+        if digest == self._sent_digests.get('low'):
+            self.logger.debug("[LOW] Payload inalterado; envio pulado")
+            return True
+        if self._send_to_api('telemetry/system', payload):
+            self._sent_digests['low'] = digest
+            self._save_state()
+            return True
+        return False
     
+    def _dispatch_high(self, data: HighFreqTelemetry):
+        """Envia telemetria de alta frequência fora do loop de coleta."""
+        if self.send_high_frequency(data):
+            self.logger.debug(
+                f"[HIGH] CPU={data.cpu}% | MEM={data.memory}% | WAN={data.wanThroughput}Mbps"
+            )
+
+    def _dispatch_medium(self, data: Dict[str, Any]):
+        """Envia telemetria de média frequência fora do loop de coleta."""
+        if self.send_medium_frequency(data):
+            iface_count = len(data.get('interfaces', []))
+            svc_count = len(data.get('services', []))
+            self.logger.debug(f"[MEDIUM] Interfaces={iface_count} | Serviços={svc_count}")
+
+    def _dispatch_low(self, data: Dict[str, Any]):
+        """Envia telemetria de baixa frequência fora do loop de coleta."""
+        if self.send_low_frequency(data):
+            uptime_hours = round(data.get('uptime', 0) / 3600, 1)
+            disk_pct = round(data.get('diskPercent', 0), 1)
+            self.logger.debug(f"[LOW] Uptime={uptime_hours}h | Disco={disk_pct}%")
+
+    def _tier_interval(self, tier: str) -> int:
+        """Retorna o intervalo configurado para um tier de coleta."""
+        if tier == 'high':
+            return self._interval_high
+        if tier == 'medium':
+            return self._interval_medium
+        return self._interval_low
+
     def run(self):
         """Loop principal do agente com coleta em tiers."""
         self.logger.info("Iniciando Firewall365 Agent v3.0.0")
@@ -553,69 +1037,69 @@ class Firewall365Agent:
             self.logger.warning("Auto-registro falhou. Verifique a conectividade.")
             self.logger.info("O agente continuará tentando registrar a cada intervalo.")
         
-        interval_high = self.config.getint('agent', 'interval_high', fallback=60)
-        interval_medium = self.config.getint('agent', 'interval_medium', fallback=300)
-        interval_low = self.config.getint('agent', 'interval_low', fallback=1800)
-        
-        self.logger.info(f"Intervalos: Alta={interval_high}s, Média={interval_medium}s, Baixa={interval_low}s")
-        
+        self.logger.info(
+            f"Intervalos: Alta={self._interval_high}s, "
+            f"Média={self._interval_medium}s, Baixa={self._interval_low}s"
+        )
+
         registration_retry = 0
         max_registration_retries = 5
-        
-        last_high = 0
-        last_medium = 0
-        last_low = 0
-        
+
+        tiers = {
+            'high': (self.collect_high_frequency, self._dispatch_high),
+            'medium': (self.collect_medium_frequency, self._dispatch_medium),
+            'low': (self.collect_low_frequency, self._dispatch_low),
+        }
+
+        # Heap de deadlines em time.monotonic(): uma espera por ciclo até o
+        # próximo tier, imune a saltos do relógio de parede. O primeiro
+        # disparo de cada tier recebe jitter para que os três coletores não
+        # fiquem sincronizados no mesmo segundo (e, entre firewalls que
+        # reiniciam juntos, não martelem a plataforma ao mesmo tempo).
+        now = time.monotonic()
+        tasks = [
+            (now + random.uniform(0, self._tier_interval(tier)), tier)
+            for tier in ('high', 'medium', 'low')
+        ]
+        heapq.heapify(tasks)
+
         while self.running:
-            current_time = time.time()
-            token = self.config.get('firewall365', 'bearer_token')
-            firewall_id = self.config.get('firewall365', 'firewall_id')
-            
-            if not token or not firewall_id:
+            self._maybe_reload_config()
+
+            if not self._fw_token or not self._fw_firewall_id:
                 if registration_retry < max_registration_retries:
                     self.logger.info(f"Tentando registro novamente ({registration_retry + 1}/{max_registration_retries})...")
                     if self.auto_register():
                         registration_retry = 0
-                    else:
-                        registration_retry += 1
+                        self._register_backoff = 0.0
+                        continue
+                    registration_retry += 1
                 else:
                     self.logger.error("Máximo de tentativas de registro atingido.")
-                time.sleep(60)
+                self._register_backoff = min(self._register_backoff * 2, 300) if self._register_backoff else 5.0
+                self._stop.wait(self._register_backoff + random.uniform(0, self._register_backoff * 0.1))
                 continue
             
-            if current_time - last_high >= interval_high:
-                data = self.collect_high_frequency()
-                if data:
-                    success = self.send_high_frequency(data)
-                    if success:
-                        self.logger.info(
-                            f"[HIGH] CPU={data['cpu']}% | MEM={data['memory']}% | WAN={data['wanThroughput']}Mbps"
-                        )
-                last_high = current_time
-            
-            if current_time - last_medium >= interval_medium:
-                data = self.collect_medium_frequency()
-                if data:
-                    success = self.send_medium_frequency(data)
-                    if success:
-                        iface_count = len(data.get('interfaces', []))
-                        svc_count = len(data.get('services', []))
-                        self.logger.info(f"[MEDIUM] Interfaces={iface_count} | Serviços={svc_count}")
-                last_medium = current_time
-            
-            if current_time - last_low >= interval_low:
-                data = self.collect_low_frequency()
-                if data:
-                    success = self.send_low_frequency(data)
-                    if success:
-                        uptime_hours = round(data.get('uptime', 0) / 3600, 1)
-                        disk_pct = round(data.get('diskPercent', 0), 1)
-                        self.logger.info(f"[LOW] Uptime={uptime_hours}h | Disco={disk_pct}%")
-                last_low = current_time
-            
-            time.sleep(1)
-        
+            deadline, tier = tasks[0]
+            wait = deadline - time.monotonic()
+            if wait > 0:
+                # O Event é sinalizado pelo handler de SIGTERM/SIGINT.
+                self._stop.wait(wait)
+                continue
+
+            heapq.heappop(tasks)
+            collect, dispatch = tiers[tier]
+            data = collect()
+            if data:
+                self._executor.submit(dispatch, data)
+            # Reagenda a partir de agora, não do deadline original, para não
+            # disparar rajadas de recuperação após um ciclo lento. O intervalo
+            # é relido do cache para honrar reloads do agent.conf.
+            heapq.heappush(tasks, (time.monotonic() + self._tier_interval(tier), tier))
+
+        self._executor.shutdown(wait=True)
         self.logger.info("Agente encerrado")
+        self._log_listener.stop()
 
 
 def main():
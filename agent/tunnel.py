@@ -12,16 +12,23 @@ Licenca: MIT
 """
 
 import os
+import re
 import sys
 import json
 import time
 import pty
 import signal
 import logging
+import logging.handlers
+import queue
+import selectors
+import socket
 import threading
 import subprocess
 import configparser
 import base64
+import hashlib
+import uuid
 from typing import Dict, Optional, Any
 
 try:
@@ -31,98 +38,203 @@ except ImportError:
     print("Instale com: python3 -m pip install websocket-client")
     sys.exit(1)
 
+try:
+    import orjson
+
+    def _json_dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    def _json_loads(data) -> Any:
+        return orjson.loads(data)
+except ImportError:
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode('utf-8')
+
+    def _json_loads(data) -> Any:
+        return json.loads(data)
+
 CONFIG_PATH = '/etc/firewall365/agent.conf'
 
+# Cobre "Password:", "password:" e "Password for user@host:".
+_PROMPT_RE = re.compile(rb'assword[: ]')
+
+# Socket de multiplexacao do ssh: sessoes abertas em ate 60s reaproveitam
+# a conexao autenticada (sem novo KEX nem novo prompt de senha).
+_SSH_CONTROL_DIR = '/var/run/firewall365'
+
+_SSH_OPTS = (
+    '-o', 'StrictHostKeyChecking=no',
+    '-o', 'UserKnownHostsFile=/dev/null',
+    '-o', 'PreferredAuthentications=password,keyboard-interactive',
+    '-o', 'PubkeyAuthentication=no',
+    '-o', 'NumberOfPasswordPrompts=1',
+)
+
 
 class SSHSession:
     """Gerencia uma sessao SSH usando PTY real."""
     
-    def __init__(self, session_id: str, username: str, password: str, 
-                 on_data: callable, on_close: callable, logger: logging.Logger):
+    def __init__(self, session_id: str, username: str, password: str,
+                 on_data: callable, on_close: callable, logger: logging.Logger,
+                 use_pty: bool = True):
         self.session_id = session_id
         self.username = username
         self.password = password
         self.on_data = on_data
         self.on_close = on_close
         self.logger = logger
+        self.use_pty = use_pty
         self.master_fd: Optional[int] = None
+        self._write_fd: Optional[int] = None
+        self._proc: Optional[subprocess.Popen] = None
         self.pid: Optional[int] = None
         self.running = False
-        self.thread: Optional[threading.Thread] = None
         self.password_sent = False
+        # Moldura JSON do frame ssh_data pre-serializada: o hot path envia
+        # prefixo + base64 + sufixo sem montar dict nem chamar json.dumps.
+        self._data_prefix = ('{"type":"ssh_data","sessionId":"' + session_id + '","data":"').encode()
+        self._data_suffix = b'"}'
+        # UUID bruto para o framing binario (fallback JSON se o id nao for
+        # um UUID valido, ex.: servidor antigo).
+        try:
+            self._sid_bytes: Optional[bytes] = uuid.UUID(session_id).bytes
+        except ValueError:
+            self._sid_bytes = None
+        # Buffer de leitura reutilizado entre drenagens: uma alocacao por
+        # lote em vez de uma por chunk lido do PTY.
+        self._rbuf = bytearray(65536)
+        self._rmv = memoryview(self._rbuf)
     
     def connect(self) -> bool:
-        """Inicia sessao SSH com PTY."""
+        """Inicia sessao SSH (PTY real ou pipes diretos quando pty=false)."""
         try:
-            self.pid, self.master_fd = pty.fork()
-            
-            if self.pid == 0:
-                os.execvp('ssh', [
-                    'ssh',
-                    '-o', 'StrictHostKeyChecking=no',
-                    '-o', 'UserKnownHostsFile=/dev/null',
-                    '-o', 'PreferredAuthentications=password,keyboard-interactive',
-                    '-o', 'PubkeyAuthentication=no',
-                    '-o', 'NumberOfPasswordPrompts=1',
-                    f'{self.username}@127.0.0.1'
-                ])
-            
+            try:
+                os.makedirs(_SSH_CONTROL_DIR, mode=0o700, exist_ok=True)
+            except OSError:
+                pass
+
+            # ControlPath com digest de usuario+senha: um master autenticado
+            # so e reaproveitado por quem apresentou as mesmas credenciais —
+            # senha errada nunca pega carona em sessao alheia.
+            cred_tag = hashlib.sha256(
+                f'{self.username}:{self.password}'.encode()).hexdigest()[:12]
+            mux_opts = (
+                '-o', 'ControlMaster=auto',
+                '-o', f'ControlPath={_SSH_CONTROL_DIR}/ssh-%r-{cred_tag}',
+                '-o', 'ControlPersist=60',
+            )
+
+            if self.use_pty:
+                self.pid, self.master_fd = pty.fork()
+
+                if self.pid == 0:
+                    os.execvp('ssh', ['ssh', *_SSH_OPTS, *mux_opts, f'{self.username}@127.0.0.1'])
+
+                self._write_fd = self.master_fd
+            else:
+                # Sem PTY os bytes nao passam pela line discipline do tty
+                # (metade das copias no kernel para saida volumosa). Nao ha
+                # como responder prompt de senha sem tty: este modo atende
+                # automacao reaproveitando um ControlMaster ja autenticado.
+                self._proc = subprocess.Popen(
+                    ['ssh', '-T', *_SSH_OPTS, *mux_opts, f'{self.username}@127.0.0.1'],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    bufsize=0
+                )
+                self.pid = self._proc.pid
+                self.master_fd = self._proc.stdout.fileno()
+                self._write_fd = self._proc.stdin.fileno()
+
+            # Leituras nao bloqueantes permitem drenar em lote no
+            # _drain_and_dispatch em vez de um on_data por chunk de 4KB.
+            os.set_blocking(self.master_fd, False)
+
             self.running = True
-            self.thread = threading.Thread(target=self._read_loop, daemon=True)
-            self.thread.start()
-            
+
             self.logger.info(f"[SSH] Sessao {self.session_id[:8]} iniciada para {self.username}@127.0.0.1")
             return True
-            
+
         except Exception as e:
-            self.logger.error(f"[SSH] Erro ao iniciar PTY: {e}")
+            self.logger.error(f"[SSH] Erro ao iniciar sessao: {e}")
             return False
     
-    def _read_loop(self):
-        """Loop de leitura do PTY."""
-        import select
-        
-        while self.running and self.master_fd is not None:
-            try:
-                readable, _, _ = select.select([self.master_fd], [], [], 0.1)
-                if readable:
-                    try:
-                        data = os.read(self.master_fd, 4096)
-                        if data:
-                            if not self.password_sent and (b'assword:' in data or b'assword for' in data):
-                                time.sleep(0.1)
-                                os.write(self.master_fd, (self.password + '\n').encode())
-                                self.password_sent = True
-                                self.on_data(self.session_id, data)
-                            else:
-                                self.on_data(self.session_id, data)
-                        else:
-                            self.running = False
-                            break
-                    except OSError as e:
-                        if e.errno == 5:
-                            self.running = False
-                            break
-                        raise
-            except Exception as e:
+    def _drain_and_dispatch(self):
+        """Drena o PTY e despacha; chamado pela thread leitora compartilhada."""
+        if not self.running or self.master_fd is None:
+            return
+        try:
+            data = self._drain()
+        except OSError as e:
+            if e.errno != 5:
                 self.logger.debug(f"[SSH] Erro na leitura: {e}")
-                self.running = False
+            data = None
+        except Exception as e:
+            self.logger.debug(f"[SSH] Erro na leitura: {e}")
+            data = None
+
+        if data is None:
+            self.running = False
+            self.on_close(self.session_id)
+            return
+
+        if data:
+            # Sem PTY nao existe prompt de senha; o scan tambem evitaria
+            # "responder" saida arbitraria que contenha "Password: ".
+            if self.use_pty and not self.password_sent and _PROMPT_RE.search(data):
+                # Responde o prompt imediatamente; o sleep de 100ms que
+                # existia aqui so atrasava a abertura da sessao.
+                os.write(self._write_fd, (self.password + '\n').encode())
+                self.password_sent = True
+            self.on_data(self.session_id, data)
+
+    def _drain(self) -> Optional[bytes]:
+        """Drena o PTY ate esvaziar (ou 64KB), acumulando em um unico buffer.
+
+        Em saida volumosa (ex.: cat de arquivo grande) isso reduz em ate
+        16x o numero de frames WebSocket gerados por MB transferido.
+        Retorna None em EOF.
+        """
+        mv = self._rmv
+        filled = 0
+        while filled < len(self._rbuf):
+            try:
+                n = os.readv(self.master_fd, [mv[filled:]])
+            except BlockingIOError:
                 break
-        
-        self.on_close(self.session_id)
-    
+            if n == 0:
+                return bytes(mv[:filled]) if filled else None
+            filled += n
+        # Copia obrigatoria: o buffer sera reutilizado na proxima drenagem.
+        return bytes(mv[:filled])
+
     def send(self, data: bytes):
-        """Envia dados para o SSH."""
-        if self.master_fd is not None and self.running:
+        """Envia dados para o SSH.
+
+        No modo PTY o fd de escrita e o mesmo fd nao bloqueante da leitura:
+        escreve em loop ate entregar tudo, esperando brevemente quando a
+        fila de entrada do tty enche (ex.: paste grande) em vez de derrubar
+        a sessao ou descartar o restante de uma escrita parcial.
+        """
+        if self._write_fd is None or not self.running:
+            return
+        view = memoryview(data)
+        while view and self.running:
             try:
-                os.write(self.master_fd, data)
+                n = os.write(self._write_fd, view)
+            except BlockingIOError:
+                time.sleep(0.01)
+                continue
             except Exception as e:
                 self.logger.error(f"[SSH] Erro ao enviar: {e}")
                 self.close()
-    
+                return
+            view = view[n:]
+
     def resize(self, rows: int, cols: int):
-        """Redimensiona o terminal."""
-        if self.master_fd is not None:
+        """Redimensiona o terminal (sem efeito em sessoes sem PTY)."""
+        if self.use_pty and self.master_fd is not None:
             try:
                 import struct
                 import fcntl
@@ -135,18 +247,30 @@ class SSHSession:
     def close(self):
         """Fecha a sessao SSH."""
         self.running = False
-        
-        if self.master_fd is not None:
+
+        if self._proc is not None:
+            # Modo pipe: fechar os streams libera os fds de ambas as pontas.
+            for stream in (self._proc.stdin, self._proc.stdout):
+                if stream is not None:
+                    try:
+                        stream.close()
+                    except Exception:
+                        pass
+            self._proc = None
+            self.master_fd = None
+        elif self.master_fd is not None:
             try:
                 os.close(self.master_fd)
             except:
                 pass
             self.master_fd = None
-        
+        self._write_fd = None
+
+        # O waitpid fica a cargo do reaper de SIGCHLD do TunnelClient; um
+        # WNOHANG aqui deixaria zumbi sempre que o ssh ainda nao saiu.
         if self.pid is not None:
             try:
                 os.kill(self.pid, signal.SIGTERM)
-                os.waitpid(self.pid, os.WNOHANG)
             except:
                 pass
             self.pid = None
@@ -166,7 +290,90 @@ class TunnelClient:
         self.ssh_sessions: Dict[str, SSHSession] = {}
         self.reconnect_delay = 5
         self.max_reconnect_delay = 60
-    
+        # Framing binario so apos o servidor anunciar suporte no connected;
+        # contra servidores antigos o ssh_data permanece em JSON/base64.
+        self._server_binary = False
+
+        # Derivados de configuracao resolvidos uma unica vez: reconexoes
+        # nao voltam ao configparser nem reconstroem a URL.
+        self._token = self.config.get('firewall365', 'bearer_token', fallback='')
+        self._ws_url = self._get_ws_url()
+        verify_ssl = self.config.getboolean('firewall365', 'verify_ssl', fallback=True)
+        self._sslopt = {} if verify_ssl else {"cert_reqs": 0, "check_hostname": False}
+        # Sem TCP_NODELAY, frames pequenos de teclado podem esperar ate
+        # 40ms pelo Nagle; buffers de 1MB absorvem rajadas de saida.
+        self._sockopt = [
+            (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+            (socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20),
+            (socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20),
+        ]
+
+        # Thread leitora unica para todas as sessoes: um selector
+        # multiplexa os PTYs em vez de uma thread select() por sessao.
+        self._sel = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+        self._sel.register(self._wake_r, selectors.EVENT_READ)
+        self._reader = threading.Thread(target=self._reader_loop, daemon=True)
+        self._reader.start()
+
+        # Reaper de filhos: colhe cada ssh encerrado na hora, sem depender
+        # de um waitpid oportunista no close() de cada sessao.
+        self._pid_to_session: Dict[int, SSHSession] = {}
+        signal.signal(signal.SIGCHLD, self._reap_children)
+
+    def _reap_children(self, signum, frame):
+        """Colhe processos ssh terminados; evita zumbis sob churn de sessoes."""
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            self._pid_to_session.pop(pid, None)
+
+    def _reader_loop(self):
+        """Multiplexa os PTYs de todas as sessoes em uma unica thread."""
+        while self.running:
+            try:
+                events = self._sel.select()
+            except OSError:
+                continue
+            for key, _ in events:
+                if key.fd == self._wake_r:
+                    try:
+                        os.read(self._wake_r, 1024)
+                    except OSError:
+                        pass
+                    continue
+                session = key.data
+                try:
+                    session._drain_and_dispatch()
+                except Exception as e:
+                    self.logger.debug(f"[SSH] Erro no despacho: {e}")
+
+    def _wake_reader(self):
+        """Acorda a thread leitora apos mudanca no conjunto de fds."""
+        try:
+            os.write(self._wake_w, b'\x00')
+        except OSError:
+            pass
+
+    def _register_session(self, session: SSHSession):
+        """Registra o PTY da sessao na thread leitora compartilhada."""
+        self._sel.register(session.master_fd, selectors.EVENT_READ, data=session)
+        self._wake_reader()
+
+    def _unregister_session(self, session: SSHSession):
+        """Remove o PTY da sessao do selector compartilhado."""
+        if session.master_fd is None:
+            return
+        try:
+            self._sel.unregister(session.master_fd)
+        except (KeyError, ValueError):
+            pass
+        self._wake_reader()
+
     def _load_config(self) -> configparser.ConfigParser:
         """Carrega configuracao."""
         config = configparser.ConfigParser()
@@ -175,23 +382,36 @@ class TunnelClient:
         return config
     
     def _setup_logging(self):
-        """Configura logging."""
+        """Configura logging.
+
+        Os handlers reais (arquivo + stdout) rodam atras de um QueueListener
+        em thread propria; a thread leitora de PTY e o handler de mensagens
+        WebSocket so enfileiram registros e nunca bloqueiam em I/O de disco.
+        """
         log_level = getattr(logging, self.config.get('agent', 'log_level', fallback='INFO'))
         log_file = self.config.get('agent', 'log_file', fallback='/var/log/firewall365/agent.log')
-        
+
         log_dir = os.path.dirname(log_file)
         if log_dir and not os.path.exists(log_dir):
             os.makedirs(log_dir, exist_ok=True)
-        
-        logging.basicConfig(
-            level=log_level,
-            format='%(asctime)s [%(levelname)s] %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S',
-            handlers=[
-                logging.FileHandler(log_file),
-                logging.StreamHandler(sys.stdout)
-            ]
+
+        formatter = logging.Formatter(
+            '%(asctime)s [%(levelname)s] %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
         )
+        file_handler = logging.FileHandler(log_file, delay=True)
+        file_handler.setFormatter(formatter)
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        root.setLevel(log_level)
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+        self._log_listener = logging.handlers.QueueListener(
+            log_queue, file_handler, stream_handler)
+        self._log_listener.start()
         self.logger = logging.getLogger('firewall365-tunnel')
     
     def _get_ws_url(self) -> str:
@@ -204,66 +424,89 @@ class TunnelClient:
         
         return f"{ws_base}/ws?type=agent&token={token}"
     
-    def _on_message(self, ws, message: str):
+    def _on_binary_message(self, message: bytes):
+        """Processa frame binario: opcode (1 byte) + UUID bruto (16) + payload."""
+        try:
+            if len(message) < 17 or message[0] != 1:
+                return
+            session_id = str(uuid.UUID(bytes=message[1:17]))
+            session = self.ssh_sessions.get(session_id)
+            if session is not None:
+                session.send(message[17:])
+        except Exception as e:
+            self.logger.error(f"[TUNNEL] Erro ao processar frame binario: {e}")
+
+    def _on_message(self, ws, message):
         """Processa mensagem do servidor."""
+        if isinstance(message, (bytes, bytearray)):
+            self._on_binary_message(bytes(message))
+            return
         try:
-            msg = json.loads(message)
+            msg = _json_loads(message)
             msg_type = msg.get('type')
             
             if msg_type == 'connected':
                 self.logger.info(f"[TUNNEL] Conectado ao servidor")
                 self.reconnect_delay = 5
+                self._server_binary = bool(msg.get('binary'))
             
             elif msg_type == 'ssh_open':
                 session_id = msg.get('sessionId')
                 username = msg.get('username', 'root')
                 password = msg.get('password', '')
-                self._open_ssh_session(session_id, username, password)
+                use_pty = bool(msg.get('pty', True))
+                self._open_ssh_session(session_id, username, password, use_pty)
             
             elif msg_type == 'ssh_data':
-                session_id = msg.get('sessionId')
-                data = msg.get('data', '')
-                if session_id in self.ssh_sessions:
-                    raw_data = base64.b64decode(data)
-                    self.ssh_sessions[session_id].send(raw_data)
-            
+                session = self.ssh_sessions.get(msg.get('sessionId'))
+                if session is not None:
+                    session.send(base64.b64decode(msg.get('data', '')))
+
             elif msg_type == 'ssh_resize':
-                session_id = msg.get('sessionId')
-                rows = msg.get('rows', 24)
-                cols = msg.get('cols', 80)
-                if session_id in self.ssh_sessions:
-                    self.ssh_sessions[session_id].resize(rows, cols)
-            
+                session = self.ssh_sessions.get(msg.get('sessionId'))
+                if session is not None:
+                    session.resize(msg.get('rows', 24), msg.get('cols', 80))
+
             elif msg_type == 'ssh_close':
-                session_id = msg.get('sessionId')
-                if session_id in self.ssh_sessions:
-                    self.ssh_sessions[session_id].close()
-                    del self.ssh_sessions[session_id]
+                session = self.ssh_sessions.pop(msg.get('sessionId'), None)
+                if session is not None:
+                    self._unregister_session(session)
+                    session.close()
             
             elif msg_type == 'ping':
-                ws.send(json.dumps({'type': 'pong'}))
+                # Keepalive real ja e feito pelos frames PING/PONG do
+                # protocolo (ping_interval no run_forever); responde o ping
+                # de aplicacao legado com um frame de controle barato.
+                ws.send(b'', opcode=websocket.ABNF.OPCODE_PONG)
         
         except Exception as e:
             self.logger.error(f"[TUNNEL] Erro ao processar mensagem: {e}")
     
-    def _open_ssh_session(self, session_id: str, username: str, password: str):
+    def _open_ssh_session(self, session_id: str, username: str, password: str,
+                          use_pty: bool = True):
         """Abre uma nova sessao SSH."""
         if session_id in self.ssh_sessions:
             self.logger.warning(f"[SSH] Sessao {session_id[:8]} ja existe")
             return
-        
+
         session = SSHSession(
             session_id=session_id,
             username=username,
             password=password,
             on_data=self._ssh_data_callback,
             on_close=self._ssh_close_callback,
-            logger=self.logger
+            logger=self.logger,
+            use_pty=use_pty
         )
         
+        # Registra antes de entrar no selector: o leitor pode emitir dados
+        # imediatamente e o callback resolve a sessao pelo dicionario.
+        self.ssh_sessions[session_id] = session
         if session.connect():
-            self.ssh_sessions[session_id] = session
+            self._pid_to_session[session.pid] = session
+            self._register_session(session)
         else:
+            del self.ssh_sessions[session_id]
             self._send_message({
                 'type': 'ssh_error',
                 'sessionId': session_id,
@@ -272,26 +515,36 @@ class TunnelClient:
     
     def _ssh_data_callback(self, session_id: str, data: bytes):
         """Callback quando ha dados do SSH."""
-        self._send_message({
-            'type': 'ssh_data',
-            'sessionId': session_id,
-            'data': base64.b64encode(data).decode('utf-8')
-        })
+        session = self.ssh_sessions.get(session_id)
+        if session is None or self.ws is None:
+            return
+        try:
+            if session._sid_bytes is not None and self._server_binary:
+                # Frame binario (opcode 1 + UUID bruto + payload): elimina o
+                # base64 e 33% dos bytes no caminho SSH -> servidor.
+                self.ws.send(b'\x01' + session._sid_bytes + data,
+                             opcode=websocket.ABNF.OPCODE_BINARY)
+            else:
+                self.ws.send(session._data_prefix + base64.b64encode(data) + session._data_suffix)
+        except Exception as e:
+            self.logger.error(f"[TUNNEL] Erro ao enviar: {e}")
     
     def _ssh_close_callback(self, session_id: str):
         """Callback quando a sessao SSH fecha."""
+        session = self.ssh_sessions.pop(session_id, None)
+        if session is not None:
+            self._unregister_session(session)
+            session.close()
         self._send_message({
             'type': 'ssh_closed',
             'sessionId': session_id
         })
-        if session_id in self.ssh_sessions:
-            del self.ssh_sessions[session_id]
     
     def _send_message(self, msg: dict):
         """Envia mensagem ao servidor."""
         if self.ws:
             try:
-                self.ws.send(json.dumps(msg))
+                self.ws.send(_json_dumps(msg))
             except Exception as e:
                 self.logger.error(f"[TUNNEL] Erro ao enviar: {e}")
     
@@ -302,41 +555,44 @@ class TunnelClient:
     def _on_close(self, ws, close_status_code, close_msg):
         """Handler de fechamento."""
         self.logger.warning(f"[TUNNEL] Conexao fechada: {close_status_code} - {close_msg}")
+        self._server_binary = False
         for session in list(self.ssh_sessions.values()):
+            self._unregister_session(session)
             session.close()
         self.ssh_sessions.clear()
     
     def _on_open(self, ws):
         """Handler de abertura."""
         self.logger.info("[TUNNEL] WebSocket conectado")
+        # Anuncia suporte ao framing binario; sem o hello o servidor
+        # continua mandando ssh_data em JSON/base64 (agentes antigos).
+        try:
+            ws.send(_json_dumps({'type': 'hello', 'binary': True}))
+        except Exception as e:
+            self.logger.error(f"[TUNNEL] Erro ao enviar hello: {e}")
     
     def run(self):
         """Loop principal do tunel."""
         self.logger.info("[TUNNEL] Iniciando Firewall365 Tunnel v2.0.0")
         
-        token = self.config.get('firewall365', 'bearer_token', fallback='')
-        if not token:
+        if not self._token:
             self.logger.error("[TUNNEL] Token nao configurado. Execute o agente principal primeiro.")
             return
-        
-        verify_ssl = self.config.getboolean('firewall365', 'verify_ssl', fallback=True)
-        
+
         while self.running:
             try:
-                ws_url = self._get_ws_url()
-                self.logger.info(f"[TUNNEL] Conectando a {ws_url[:50]}...")
-                
-                sslopt = {} if verify_ssl else {"cert_reqs": 0, "check_hostname": False}
-                
+                self.logger.info(f"[TUNNEL] Conectando a {self._ws_url[:50]}...")
+
                 self.ws = websocket.WebSocketApp(
-                    ws_url,
+                    self._ws_url,
                     on_message=self._on_message,
                     on_error=self._on_error,
                     on_close=self._on_close,
                     on_open=self._on_open
                 )
                 
-                self.ws.run_forever(sslopt=sslopt, ping_interval=30, ping_timeout=10)
+                self.ws.run_forever(sslopt=self._sslopt, sockopt=self._sockopt,
+                                    ping_interval=30, ping_timeout=10)
                 
             except Exception as e:
                 self.logger.error(f"[TUNNEL] Excecao: {e}")
@@ -347,10 +603,12 @@ class TunnelClient:
                 self.reconnect_delay = min(self.reconnect_delay * 2, self.max_reconnect_delay)
         
         self.logger.info("[TUNNEL] Encerrado")
-    
+        self._log_listener.stop()
+
     def stop(self):
         """Para o tunel."""
         self.running = False
+        self._wake_reader()
         if self.ws:
             self.ws.close()
 
@@ -7,6 +7,7 @@ interface AgentConnection {
   ws: WebSocket;
   firewallId: string;
   sshSessions: Map<string, WebSocket>;
+  binaryCapable: boolean;
 }
 
 interface TerminalConnection {
@@ -24,6 +25,20 @@ interface WsSessionToken {
   expiresAt: number;
 }
 
+// Binary ssh_data framing: 1-byte opcode + 16-byte raw session UUID + payload.
+// Avoids base64 + JSON on the per-keystroke path; JSON remains for control
+// messages and older agents.
+const BINARY_SSH_DATA = 1;
+
+function uuidToBuffer(id: string): Buffer {
+  return Buffer.from(id.replace(/-/g, ""), "hex");
+}
+
+function bufferToUuid(buf: Buffer): string {
+  const hex = buf.toString("hex");
+  return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+}
+
 const agentConnections = new Map<string, AgentConnection>();
 const terminalConnections = new Map<string, TerminalConnection>();
 const wsSessionTokens = new Map<string, WsSessionToken>();
@@ -55,7 +70,17 @@ export function validateWsSessionToken(token: string): WsSessionToken | null {
 }
 
 export function setupWebSocket(server: Server) {
-  const wss = new WebSocketServer({ server, path: "/ws" });
+  // Terminal output compresses well (escape sequences, whitespace, log
+  // lines). Browsers negotiate permessage-deflate natively; peers that do
+  // not offer the extension (the Python agent) keep uncompressed frames.
+  const wss = new WebSocketServer({
+    server,
+    path: "/ws",
+    perMessageDeflate: {
+      threshold: 256,
+      concurrencyLimit: 10,
+    },
+  });
 
   wss.on("connection", (ws, req) => {
     const url = new URL(req.url || "", `http://${req.headers.host}`);
@@ -92,17 +117,30 @@ async function handleAgentConnection(ws: WebSocket, token: string | null) {
   const firewallId = apiToken.firewallId;
   console.log(`[websocket] Agent connected: ${firewallId}`);
 
+  // Binary frames are only sent to agents that advertised support (hello
+  // message or a binary frame of their own); older agents keep base64 JSON.
   const connection: AgentConnection = {
     ws,
     firewallId,
     sshSessions: new Map(),
+    binaryCapable: false,
   };
 
   agentConnections.set(firewallId, connection);
 
-  ws.on("message", (data) => {
+  ws.on("message", (data, isBinary) => {
     try {
-      const message = JSON.parse(data.toString());
+      const buf = Buffer.isBuffer(data) ? data : Buffer.from(data as ArrayBuffer);
+      if (isBinary && buf.length >= 17 && buf[0] === BINARY_SSH_DATA) {
+        connection.binaryCapable = true;
+        const sessionId = bufferToUuid(buf.subarray(1, 17));
+        const termWs = connection.sshSessions.get(sessionId);
+        if (termWs && termWs.readyState === WebSocket.OPEN) {
+          termWs.send(buf.subarray(17));
+        }
+        return;
+      }
+      const message = JSON.parse(buf.toString());
       handleAgentMessage(connection, message);
     } catch (e) {
       console.error("[websocket] Invalid agent message:", e);
@@ -121,7 +159,7 @@ async function handleAgentConnection(ws: WebSocket, token: string | null) {
     console.error(`[websocket] Agent error (${firewallId}):`, err.message);
   });
 
-  ws.send(JSON.stringify({ type: "connected", firewallId }));
+  ws.send(JSON.stringify({ type: "connected", firewallId, binary: true }));
 }
 
 async function handleTerminalConnection(
@@ -184,14 +222,20 @@ async function handleTerminalConnection(
     password: sshPassword,
   }));
 
+  const sessionIdBytes = uuidToBuffer(sessionId);
+
   ws.on("message", (data) => {
     if (agentConn.ws.readyState === WebSocket.OPEN) {
       const buffer = Buffer.isBuffer(data) ? data : Buffer.from(data as ArrayBuffer);
-      agentConn.ws.send(JSON.stringify({
-        type: "ssh_data",
-        sessionId,
-        data: buffer.toString("base64"),
-      }));
+      if (sessionIdBytes.length === 16 && agentConn.binaryCapable) {
+        agentConn.ws.send(Buffer.concat([Buffer.from([BINARY_SSH_DATA]), sessionIdBytes, buffer]));
+      } else {
+        agentConn.ws.send(JSON.stringify({
+          type: "ssh_data",
+          sessionId,
+          data: buffer.toString("base64"),
+        }));
+      }
     }
   });
 
@@ -216,7 +260,9 @@ async function handleTerminalConnection(
 function handleAgentMessage(connection: AgentConnection, message: any) {
   const { type, sessionId, data } = message;
 
-  if (type === "ssh_data" && sessionId) {
+  if (type === "hello") {
+    connection.binaryCapable = message.binary === true;
+  } else if (type === "ssh_data" && sessionId) {
     const termWs = connection.sshSessions.get(sessionId);
     if (termWs && termWs.readyState === WebSocket.OPEN) {
       const buffer = Buffer.from(data, "base64");